@@ -3,22 +3,41 @@ import logging
 import datetime
 import os
 import random
+import re
 import signal
 from typing import List, Dict, Any
 from urllib.parse import urlparse
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, retry_if_exception
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError, Error as PlaywrightError
 from dotenv import load_dotenv
-from logging.handlers import RotatingFileHandler
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import pickle
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from functools import wraps, lru_cache
+import asyncio
 import time
-import glob
-import urllib.parse
-import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import xxhash
 
 
-from json_to_csv import process_api_responses, process_graphql_responses
+# orjson is the fastest decoder; msgspec and then the standard library are used when it is not installed.
+# json_dumps always returns bytes.
+try:
+    import orjson
+
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+    JSONDecodeError = orjson.JSONDecodeError
+except ImportError:
+    try:
+        import msgspec
+
+        json_loads = msgspec.json.Decoder().decode
+        json_dumps = msgspec.json.encode
+        JSONDecodeError = msgspec.DecodeError
+    except ImportError:
+        json_loads = json.loads
+        JSONDecodeError = json.JSONDecodeError
+
+        def json_dumps(obj):
+            return json.dumps(obj).encode()
 
 # Load environment variables
 try:
@@ -34,9 +53,13 @@ REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', '60000'))
 RATE_LIMIT_DELAY = float(os.getenv('RATE_LIMIT_DELAY', '1.0'))
 MAX_RETRIES = int(os.getenv('MAX_RETRIES', '3'))
 RAW_DATA_FILE = os.getenv('RAW_DATA_FILE', 'raw_responses.json')
-MAX_WORKERS = int(os.getenv('MAX_WORKERS', '5'))
+# Pages mostly wait on the network, so by default a few are run per core
+MAX_WORKERS = int(os.getenv('MAX_WORKERS', str(min(32, (os.cpu_count() or 1) * 5))))
 AGE_CONFIRMATION_TIMEOUT = int(os.getenv('AGE_CONFIRMATION_TIMEOUT', '5000'))
 AGE_CONFIRMATION_SELECTOR = os.getenv('AGE_CONFIRMATION_SELECTOR', 'button#age-confirmation')
+MAX_RESPONSE_BYTES = int(os.getenv('MAX_RESPONSE_BYTES', '16777216'))
+GZIP_OUTPUT = os.getenv('GZIP_OUTPUT', 'False').lower() == 'true'
+CSV_EXTENSION = '.csv.gz' if GZIP_OUTPUT else '.csv'
 
 
 def validate_config():
@@ -52,18 +75,49 @@ def validate_config():
         raise ValueError("MAX_WORKERS must be positive")
     if AGE_CONFIRMATION_TIMEOUT <= 0:
         raise ValueError("AGE_CONFIRMATION_TIMEOUT must be positive")
+    if MAX_RESPONSE_BYTES <= 0:
+        raise ValueError("MAX_RESPONSE_BYTES must be positive")
 
 
 validate_config()
 
 # User Agents
-USER_AGENTS = [
+USER_AGENTS = (
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
     'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.1 Safari/605.1.15',
     'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0',
     'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:89.0) Gecko/20100101 Firefox/89.0'
-]
+)
+
+# Seeded per process so user agents are not drawn from the shared global random instance
+user_agent_random = random.Random(os.getpid() ^ time.time_ns())
+
+# Classifies response URLs in one pass: group 1 is a Dutchie API call, group 2 an iHeartJane one
+API_URL_PATTERN = re.compile(r'(dutchie\.com)|(iheartjane\.com)', re.IGNORECASE)
+
+# Only documents, scripts and the fetch/xhr API calls are needed to capture responses
+BLOCKED_RESOURCE_TYPES = frozenset({'image', 'font', 'stylesheet', 'media', 'other'})
+
+# Keep background pages running at full speed (every URL is a tab in the same browser), use /tmp instead of
+# the often tiny /dev/shm, hide the automation flag some menus slow down for, and cap each renderer's JS heap
+CHROMIUM_ARGS = (
+    '--disable-dev-shm-usage',
+    '--disable-background-timer-throttling',
+    '--disable-renderer-backgrounding',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-blink-features=AutomationControlled',
+    '--js-flags=--max-old-space-size=512',
+)
+
+# Analytics and ad hosts never serve menu data, requests to them (or their subdomains) are aborted
+BLOCKED_TRACKER_HOSTS = frozenset({
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+    'googleadservices.com', 'facebook.net', 'facebook.com', 'hotjar.com',
+    'segment.io', 'segment.com', 'mixpanel.com', 'amplitude.com', 'fullstory.com', 'clarity.ms',
+    'bing.com', 'tiktok.com', 'snapchat.com', 'pinterest.com', 'twitter.com', 'sentry.io',
+    'newrelic.com', 'nr-data.net', 'datadoghq.com', 'intercom.io', 'klaviyo.com',
+})
 
 
 def setup_logging():
@@ -78,22 +132,97 @@ def setup_logging():
     logging.getLogger().addHandler(file_handler)
 
 
+def setup_worker_logging(log_queue):
+    # CSV worker processes hand their records to the parent, which owns the only handle on the rotating log file
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(log_queue)]
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO'))
+
+
+@lru_cache(maxsize=1024)
+def parse_url(url: str):
+    # The same page, script and API URLs are parsed over and over across pages, so the results are memoized
+    return urlparse(url)
+
+
 def is_valid_url(url: str) -> bool:
     try:
-        result = urlparse(url)
+        result = parse_url(url)
         return all([result.scheme, result.netloc])
     except ValueError:
         return False
 
 
-def rate_limit():
-    time.sleep(RATE_LIMIT_DELAY)
+class TokenBucket:
+    # Shared rate limit for URL start-ups: up to capacity may start at once, after that one per delay seconds.
+    # Tokens refill with elapsed time, so time spent scraping counts towards the next start.
+    def __init__(self, delay, capacity):
+        self.delay = delay
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.delay <= 0:
+            return
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) / self.delay)
+            self._last = now
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) * self.delay)
+                self._tokens = 1
+                self._last = time.monotonic()
+            self._tokens -= 1
+
+
+class AdaptiveSemaphore:
+    # Concurrency limit that halves after timeout_threshold URLs in a row time out and grows back by one per
+    # success, up to max_limit, so a slow or rate-limiting site gets fewer parallel pages while a fast one keeps
+    # all MAX_WORKERS busy. Other failures leave the limit alone.
+    def __init__(self, max_limit, timeout_threshold=3):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.timeout_threshold = timeout_threshold
+        self._consecutive_timeouts = 0
+        self._active = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    async def increase(self):
+        async with self._condition:
+            self._consecutive_timeouts = 0
+            if self.limit < self.max_limit:
+                self.limit += 1
+                self._condition.notify_all()
+
+    async def record_timeout(self):
+        async with self._condition:
+            self._consecutive_timeouts += 1
+            if self._consecutive_timeouts < self.timeout_threshold:
+                return
+            self._consecutive_timeouts = 0
+            if self.limit > 1:
+                self.limit = max(1, self.limit // 2)
+                logging.warning(f"Reducing concurrent scrapes to {self.limit}")
 
 
 def save_raw_responses(responses: List[Dict[str, Any]], filename: str):
     try:
-        with open(filename, 'w') as f:
-            json.dump(responses, f)
+        with open(filename, 'wb') as f:
+            f.write(json_dumps(responses))
     except IOError as e:
         logging.error(f"Error saving raw responses: {e}")
 
@@ -101,61 +230,102 @@ def save_raw_responses(responses: List[Dict[str, Any]], filename: str):
 def load_raw_responses(filename: str) -> List[Dict[str, Any]]:
     try:
         if os.path.exists(filename):
-            with open(filename, 'r') as f:
-                return json.load(f)
-    except (IOError, json.JSONDecodeError) as e:
+            with open(filename, 'rb') as f:
+                return json_loads(f.read())
+    except (IOError, JSONDecodeError) as e:
         logging.error(f"Error loading raw responses: {e}")
     return []
 
 
 def intercept_graphql(request):
+    # Debug-only request logger, only registered on the page when DEBUG logging is enabled
     if (request.resource_type == "fetch" or request.resource_type == "xhr") and "graphql" in request.url.lower():
-        logging.info(f"GraphQL Request URL: {request.url}")
-        logging.info(f"GraphQL Request Method: {request.method}")
-        logging.info(f"GraphQL Request Headers: {request.headers}")
+        logging.debug(f"GraphQL Request URL: {request.url}")
+        logging.debug(f"GraphQL Request Method: {request.method}")
+        logging.debug(f"GraphQL Request Headers: {request.headers}")
         try:
-            body = request.post_data
-            if body:
-                json_body = json.loads(body)
-                logging.info(f"GraphQL Request Body: {json.dumps(json_body, indent=2)}")
-            else:
-                logging.info("GraphQL Request Body: Empty")
-        except json.JSONDecodeError:
-            logging.warning(f"Failed to parse JSON request body: {body}")
+            logging.debug(f"GraphQL Request Body: {request.post_data or 'Empty'}")
         except Exception as e:
             logging.error(f"Error processing request body: {str(e)}")
 
 
-def scroll_to_bottom(page, max_scroll_time=30, scroll_pause=1.0):
-    start_time = time.time()
-    last_height = page.evaluate("document.body.scrollHeight")
-    while time.time() - start_time < max_scroll_time:
-        page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-        time.sleep(scroll_pause)
-        new_height = page.evaluate("document.body.scrollHeight")
-        if new_height == last_height:
-            break
-        last_height = new_height
+# Runs the whole scroll loop in the page: scroll to the bottom, check the height every short tick and
+# stop once it has not grown for scroll_pause, or when max_scroll_time runs out
+SCROLL_TO_BOTTOM_JS = """async ([maxScrollMs, scrollPauseMs]) => {
+    const deadline = Date.now() + maxScrollMs;
+    const tickMs = Math.min(250, scrollPauseMs);
+    let lastHeight = document.body.scrollHeight;
+    let stableMs = 0;
+    while (Date.now() < deadline && stableMs < scrollPauseMs) {
+        window.scrollTo(0, document.body.scrollHeight);
+        await new Promise(resolve => setTimeout(resolve, tickMs));
+        const newHeight = document.body.scrollHeight;
+        if (newHeight === lastHeight) {
+            stableMs += tickMs;
+        } else {
+            stableMs = 0;
+            lastHeight = newHeight;
+        }
+    }
+    return lastHeight;
+}"""
+
+
+async def scroll_to_bottom(page, max_scroll_time=30, scroll_pause=1.0):
+    from playwright.async_api import Error as PlaywrightError
+
+    # One round trip to the page instead of three per scroll step
+    args = [max_scroll_time * 1000, scroll_pause * 1000]
+    try:
+        return await page.evaluate(SCROLL_TO_BOTTOM_JS, args)
+    except PlaywrightError as e:
+        # A redirect or client-side reload during the long evaluate destroys its context, scroll the new document once
+        if "Execution context was destroyed" not in str(e):
+            raise
+        logging.warning(f"Page navigated while scrolling, scrolling the new page: {page.url}")
+        await page.wait_for_load_state('domcontentloaded')
+        return await page.evaluate(SCROLL_TO_BOTTOM_JS, args)
+
+
+def is_tracker_host(host: str) -> bool:
+    # Check the host and each parent domain, e.g. a.b.hotjar.com -> b.hotjar.com -> hotjar.com
+    while host:
+        if host in BLOCKED_TRACKER_HOSTS:
+            return True
+        _, _, host = host.partition('.')
+    return False
+
+
+async def block_unneeded_resources(route):
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or is_tracker_host(parse_url(request.url).hostname or ''):
+        await route.abort()
+    else:
+        await route.continue_()
 
 
 def performance_monitor(func):
-    def wrapper(*args, **kwargs):
-        start_time = time.time()
-        result = func(*args, **kwargs)
-        end_time = time.time()
-        logging.info(f"Function {func.__name__} took {end_time - start_time:.2f} seconds to execute.")
-        return result
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            # Logged for failed calls too, those are usually the slow ones
+            logging.info(f"Function {func.__name__} took {time.perf_counter() - start_time:.2f} seconds to execute.")
 
     return wrapper
 
 
-def handle_age_confirmation(page):
+async def handle_age_confirmation(page):
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
     try:
-        confirm_button = page.wait_for_selector(AGE_CONFIRMATION_SELECTOR, timeout=AGE_CONFIRMATION_TIMEOUT)
+        confirm_button = await page.wait_for_selector(AGE_CONFIRMATION_SELECTOR, timeout=AGE_CONFIRMATION_TIMEOUT)
         if confirm_button:
             logging.info("Age confirmation dialog detected. Attempting to click confirmation button.")
-            confirm_button.click()
-            page.wait_for_load_state("networkidle", timeout=5000)
+            await confirm_button.click()
+            await page.wait_for_load_state("networkidle", timeout=5000)
             logging.info("Age confirmation button clicked successfully.")
         else:
             logging.info("No age confirmation dialog detected.")
@@ -165,82 +335,226 @@ def handle_age_confirmation(page):
         logging.error(f"Error handling age confirmation: {str(e)}")
 
 
-def custom_timeout_handler(page, timeout):
+async def custom_timeout_handler(page, timeout):
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
     try:
         logging.info(f"Waiting for networkidle state (timeout: {timeout}ms)...")
-        page.wait_for_load_state("networkidle", timeout=timeout)
+        await page.wait_for_load_state("networkidle", timeout=timeout)
         logging.info("Networkidle state reached")
     except PlaywrightTimeoutError:
         logging.warning(f"Networkidle not reached after {timeout}ms, checking if page is usable")
-        if page.query_selector('body'):
+        if await page.query_selector('body'):
             logging.info("Page body found, continuing with scraping")
         else:
             logging.error("Page body not found after timeout")
             raise PlaywrightTimeoutError("Page body not found after timeout")
 
 
+async def wait_for_page_or_response(page, response_event, timeout, response_timeout=5000):
+    # API responses usually arrive during goto, long before the menu has rendered, so networkidle is still
+    # waited for, only capped at response_timeout once a response has been captured
+    load_task = asyncio.ensure_future(custom_timeout_handler(page, timeout))
+    response_task = asyncio.ensure_future(response_event.wait())
+    try:
+        done, _ = await asyncio.wait((load_task, response_task), return_when=asyncio.FIRST_COMPLETED)
+        if load_task not in done:
+            done, _ = await asyncio.wait((load_task,), timeout=response_timeout / 1000)
+    finally:
+        response_task.cancel()
+        if not load_task.done():
+            load_task.cancel()
+    if load_task in done:
+        load_task.result()
+    else:
+        logging.info(f"Networkidle not reached {response_timeout}ms after an API response, continuing with scraping")
+
+
 def retry_on_network_error(func):
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=retry_if_exception_type((PlaywrightTimeoutError, ConnectionError))
-    )
-    def wrapper(*args, **kwargs):
-        return func(*args, **kwargs)
+    # tenacity is only imported once the wrapped coroutine is first called
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential, retry_if_exception
+
+        async for attempt in AsyncRetrying(stop=stop_after_attempt(MAX_RETRIES),
+                                           wait=wait_exponential(multiplier=1, min=4, max=10),
+                                           retry=retry_if_exception(should_retry_exception)):
+            with attempt:
+                return await func(*args, **kwargs)
 
     return wrapper
 
 
-def save_progress(filename, responses, graphql_url):
+def progress_meta_filename(filename):
+    return f"{os.path.splitext(filename)[0]}.meta.json"
+
+
+class ProgressSaver:
+    # Progress is append-only: one JSON line per new response, the API URL goes in a sidecar written once.
+    # Lines are buffered and appended in batches, so a burst of responses while scrolling costs one write.
+    # A buffered line is written within flush_interval seconds even if no further response arrives.
+    # The file is opened once and only fsync'd when the scrape is done.
+    def __init__(self, filename, max_pending=20, flush_interval=1.0):
+        self.filename = filename
+        self.meta_filename = progress_meta_filename(filename)
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self._file = None
+        self._pending = []
+        self._flush_handle = None
+        self._meta_written = os.path.exists(self.meta_filename)
+
+    def save(self, response, body_hash, graphql_url):
+        if not self._meta_written:
+            self._write_meta(graphql_url)
+        self._pending.append(json_dumps({'hash': format(body_hash, 'x'), 'response': response}) + b'\n')
+        if len(self._pending) >= self.max_pending:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        try:
+            if self._file is None:
+                self._file = open(self.filename, 'ab')
+            self._file.write(b''.join(self._pending))
+            self._file.flush()
+            logging.info(f"Progress saved to file: {self.filename} ({len(self._pending)} new responses)")
+            self._pending.clear()
+        except Exception as e:
+            logging.error(f"Error saving progress to {self.filename}: {str(e)}")
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            try:
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                logging.error(f"Error syncing progress file {self.filename}: {str(e)}")
+            self._file.close()
+            self._file = None
+
+    def _write_meta(self, graphql_url):
+        # Written to a temporary file first so a crash never leaves a half-written sidecar
+        try:
+            tmp_filename = f"{self.meta_filename}.tmp"
+            with open(tmp_filename, 'wb') as f:
+                f.write(json_dumps({'graphql_url': graphql_url}))
+            os.replace(tmp_filename, self.meta_filename)
+            self._meta_written = True
+        except Exception as e:
+            logging.error(f"Error saving progress metadata to {self.meta_filename}: {str(e)}")
+
+
+def parse_progress_line(line):
+    # Returns (response, hash) or None for a partial or corrupt line
+    if not line.endswith(b'\n'):
+        return None
     try:
-        with open(filename, 'wb') as f:
-            pickle.dump({'responses': responses, 'graphql_url': graphql_url}, f)
-        logging.info(f"Progress saved to file: {filename}")
-    except Exception as e:
-        logging.error(f"Error saving progress to {filename}: {str(e)}")
+        entry = json_loads(line)
+        return entry['response'], int(entry['hash'], 16)
+    except (JSONDecodeError, KeyError, TypeError, ValueError):
+        return None
 
 
 def load_progress(filename):
+    responses = []
+    seen_hashes = set()
     try:
         if os.path.exists(filename):
-            with open(filename, 'rb') as f:
-                progress = pickle.load(f)
+            offset = 0
+            bad_offset = None
+            with open(filename, 'r+b') as f:
+                for line in f:
+                    parsed = parse_progress_line(line)
+                    if parsed is None:
+                        # Older files can have a fused line in the middle, only that line is dropped
+                        logging.warning(f"Skipping corrupt progress entry at byte {offset} in {filename}")
+                        bad_offset = offset
+                    else:
+                        responses.append(parsed[0])
+                        seen_hashes.add(parsed[1])
+                        bad_offset = None
+                    offset += len(line)
+                # A crash mid-write leaves a partial last line, cut it off so resumed appends start on a fresh line
+                if bad_offset is not None:
+                    f.truncate(bad_offset)
+            with open(progress_meta_filename(filename), 'rb') as f:
+                graphql_url = json_loads(f.read())['graphql_url']
             logging.info(f"Progress loaded from file: {filename}")
-            return progress['responses'], progress['graphql_url']
+            return responses, graphql_url, seen_hashes
     except Exception as e:
         logging.error(f"Error loading progress from {filename}: {str(e)}")
-    return [], None
+    return [], None, set()
+
+
+class SanitizeTable(dict):
+    # str.translate table that keeps letters, digits, spaces, dashes and underscores.
+    # Entries are filled in on first use so non-ASCII letters and digits are kept without a table of every code point.
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        value = codepoint if char.isalpha() or char.isdigit() or char in ' -_' else None
+        self[codepoint] = value
+        return value
+
+
+SANITIZE_TABLE = SanitizeTable()
 
 
 def sanitize_filename(filename):
-    return "".join([c for c in filename if c.isalpha() or c.isdigit() or c in [' ', '-', '_']]).rstrip()
+    return filename.translate(SANITIZE_TABLE).rstrip()
 
 
 def should_retry_exception(exception):
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
     return isinstance(exception, (PlaywrightTimeoutError, ConnectionError))
 
 
+def is_timeout_exception(exception):
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+    from tenacity import RetryError
+
+    # Timeouts that outlast retry_on_network_error arrive wrapped in a RetryError
+    if isinstance(exception, RetryError):
+        exception = exception.last_attempt.exception()
+    return isinstance(exception, PlaywrightTimeoutError)
+
+
 @performance_monitor
-@retry(stop=stop_after_attempt(MAX_RETRIES),
-       wait=wait_exponential(multiplier=1, min=4, max=10),
-       retry=retry_if_exception(should_retry_exception))
-def scrape_url(url: str):
+@retry_on_network_error
+async def scrape_url(url: str, browser, csv_pool=None):
+    # Imported here so that importing this module (e.g. in spawned worker processes) stays cheap
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+    from json_to_csv import (process_api_responses, process_graphql_responses, open_csv_writer, append_response,
+                             clean_dutchie_data, clean_iheartjane_data, CLEANED_FIELDNAMES)
+
     if not is_valid_url(url):
         logging.error(f"Invalid URL: {url}")
         return
 
     sanitized_url = sanitize_filename(url)
-    progress_file = f"progress_{sanitized_url}.pkl"
+    progress_file = f"progress_{sanitized_url}.jsonl"
 
-    url_responses, saved_api_url = load_progress(progress_file)
+    url_responses, saved_api_url, seen_hashes = load_progress(progress_file)
+    progress_saver = ProgressSaver(progress_file)
     if url_responses:
         logging.info(f"Resuming scraping for URL: {url} with {len(url_responses)} saved responses")
     else:
         logging.info(f"Starting new scrape for URL: {url}")
         url_responses = []
         saved_api_url = None
+        seen_hashes = set()
 
     last_response_time = time.time()
+    new_response_event = asyncio.Event()
+    live_csv_file = None
+    live_csv_writer = None
     no_new_responses_timeout = 30  # Time in seconds to wait for new responses before concluding
 
     # Create a folder with today's date
@@ -249,218 +563,197 @@ def scrape_url(url: str):
     os.makedirs(base_output_folder, exist_ok=True)
 
     # Create a subfolder for this specific URL
-    url_hash = hashlib.md5(url.encode()).hexdigest()[:10]  # Use first 10 characters of MD5 hash
-    url_folder_name = f"{urllib.parse.urlparse(url).netloc}_{url_hash}"
+    url_hash = format(xxhash.xxh3_64_intdigest(url.encode()), '016x')[:10]  # Use first 10 hex characters of the XXH3 hash
+    url_folder_name = f"{parse_url(url).netloc}_{url_hash}"
     output_folder = os.path.join(base_output_folder, sanitize_filename(url_folder_name))
     os.makedirs(output_folder, exist_ok=True)
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=HEADLESS_MODE)
-        context = browser.new_context(user_agent=random.choice(USER_AGENTS))
-        page = context.new_page()
-
-        api_url = saved_api_url  # Use saved API URL if available
-
-        def handle_response(response):
-            nonlocal api_url, url_responses, last_response_time
-            if response.request.resource_type in ["fetch", "xhr"]:
-                is_dutchie = "dutchie.com" in response.url.lower()
-                is_iheartjane = "iheartjane.com" in response.url.lower() or "x-algolia-agent" in response.request.headers
-
-                if is_dutchie:
-                    # Handle Dutchie URLs as GraphQL
-                    api_url = response.url  # Capture the API URL
-                    try:
-                        json_response = response.json()
-                        if not any(existing_response == json_response for existing_response in url_responses):
-                            url_responses.append(json_response)
-                            last_response_time = time.time()
-                            logging.info(f"New Dutchie (GraphQL) response captured. Total responses: {len(url_responses)}")
-                            save_progress(progress_file, url_responses, api_url)
-
-                            # Write CSVs with current responses
-                            timestamp = int(time.time())
-                            output_file_dutchie = os.path.join(output_folder, f"output_dutchie_{sanitized_url}_{timestamp}.csv")
-                            output_file_generic = os.path.join(output_folder, f"output_generic_{sanitized_url}_{timestamp}.csv")
-                            output_file_unflattened = os.path.join(output_folder, f"output_unflattened_{sanitized_url}_{timestamp}.csv")
-                            process_graphql_responses(url_responses, output_file_dutchie, output_file_generic, output_file_unflattened, api_url)
-
-                    except json.JSONDecodeError:
-                        logging.warning(f"Failed to parse JSON response for URL: {url}")
-                    except Exception as e:
-                        logging.error(f"Error processing Dutchie (GraphQL) response for URL {url}: {str(e)}")
-
-                elif is_iheartjane:
-                    # Handle iHeartJane URLs as JSON
-                    api_url = response.url  # Capture the API URL
-                    try:
-                        json_response = response.json()
-                        if not any(existing_response == json_response for existing_response in url_responses):
-                            url_responses.append(json_response)
-                            last_response_time = time.time()
-                            logging.info(f"New iHeartJane (JSON) response captured. Total responses: {len(url_responses)}")
-                            save_progress(progress_file, url_responses, api_url)
-
-                            # Write CSVs with current responses
-                            timestamp = int(time.time())
-                            output_file_cleaned = os.path.join(output_folder, f"output_cleaned_{sanitized_url}_{timestamp}.csv")
-                            output_file_generic = os.path.join(output_folder, f"output_generic_{sanitized_url}_{timestamp}.csv")
-                            output_file_unflattened = os.path.join(output_folder, f"output_unflattened_{sanitized_url}_{timestamp}.csv")
-                            process_api_responses(url_responses, output_file_cleaned, output_file_generic, output_file_unflattened, api_url)
-
-                    except json.JSONDecodeError:
-                        logging.warning(f"Failed to parse JSON response for URL: {url}")
-                    except Exception as e:
-                        logging.error(f"Error processing iHeartJane (JSON) response for URL {url}: {str(e)}")
-
-        page.on("response", handle_response)
-
-        try:
-            logging.info(f"Navigating to URL: {url}")
+    def output_file(prefix, timestamp):
+        # Only the basename is formatted, the folder (from the cwd) and the URL may contain '%' or braces
+        return os.path.join(output_folder, f"{prefix}_{sanitized_url}_{timestamp}{CSV_EXTENSION}")
+
+    # Each URL gets its own context so cookies and age-gate state aren't shared between dispensaries
+    context = await browser.new_context(user_agent=user_agent_random.choice(USER_AGENTS))
+    page = await context.new_page()
+    await page.route("**/*", block_unneeded_resources)
+
+    api_url = saved_api_url  # Use saved API URL if available
+
+    def append_to_live_csv(json_response, file_prefix, cleaner):
+        # Only the new response is cleaned and appended; the final CSVs are still written from all responses
+        nonlocal live_csv_file, live_csv_writer
+        if live_csv_writer is None:
+            live_csv_file, live_csv_writer = open_csv_writer(
+                output_file(file_prefix, int(time.time())), CLEANED_FIELDNAMES)
+            for previous_response in url_responses[:-1]:
+                append_response(live_csv_writer, previous_response, cleaner)
+        append_response(live_csv_writer, json_response, cleaner)
+        live_csv_file.flush()
+
+    async def handle_response(response):
+        nonlocal api_url, url_responses, last_response_time
+        request = response.request
+        if request.resource_type not in ("fetch", "xhr"):
+            return
+
+        # Classify on the URL and cached headers before touching the body, most responses are not the target API
+        match = API_URL_PATTERN.search(response.url)
+        is_dutchie = match is not None and match.group(1) is not None
+        is_iheartjane = not is_dutchie and (match is not None or "x-algolia-agent" in request.headers)
+        if not (is_dutchie or is_iheartjane):
+            return
+
+        # Skip bodies the pipeline can't use before downloading them
+        headers = response.headers
+        if "json" not in headers.get("content-type", ""):
+            return
+        content_length = headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > MAX_RESPONSE_BYTES:
+            logging.warning(f"Skipping {content_length} byte response from {response.url} (MAX_RESPONSE_BYTES={MAX_RESPONSE_BYTES})")
+            return
+
+        if is_dutchie:
+            # Handle Dutchie URLs as GraphQL
+            api_url = response.url  # Capture the API URL
             try:
-                page.goto(url)
+                raw_body = await response.body()
+                body_hash = xxhash.xxh3_128_intdigest(raw_body)
+                if body_hash not in seen_hashes:
+                    json_response = json_loads(raw_body)
+                    seen_hashes.add(body_hash)
+                    url_responses.append(json_response)
+                    last_response_time = time.time()
+                    new_response_event.set()
+                    logging.info(f"New Dutchie (GraphQL) response captured. Total responses: {len(url_responses)}")
+                    progress_saver.save(json_response, body_hash, api_url)
+
+                    append_to_live_csv(json_response, "output_dutchie", clean_dutchie_data)
+
+            except JSONDecodeError:
+                logging.warning(f"Failed to parse JSON response for URL: {url}")
             except Exception as e:
-                if "net::ERR_HTTP2_PROTOCOL_ERROR" in str(e):
-                    logging.warning(f"Encountered HTTP/2 protocol error for URL: {url}. Skipping...")
-                    return
-                else:
-                    raise
-
-            logging.info("Waiting for page load...")
-            custom_timeout_handler(page, REQUEST_TIMEOUT)
-            logging.info(f"Loaded: {url}")
+                logging.error(f"Error processing Dutchie (GraphQL) response for URL {url}: {str(e)}")
 
-            logging.info("Handling age confirmation...")
-            handle_age_confirmation(page)
-
-            logging.info("Scrolling to bottom of page...")
-            scroll_to_bottom(page)
-
-            while True:
-                logging.info("Waiting for new responses...")
-                page.wait_for_timeout(5000)
-
-                if time.time() - last_response_time > no_new_responses_timeout:
-                    logging.info(f"No new responses received in the last {no_new_responses_timeout} seconds. Concluding scrape.")
-                    break
+        elif is_iheartjane:
+            # Handle iHeartJane URLs as JSON
+            api_url = response.url  # Capture the API URL
+            try:
+                raw_body = await response.body()
+                body_hash = xxhash.xxh3_128_intdigest(raw_body)
+                if body_hash not in seen_hashes:
+                    json_response = json_loads(raw_body)
+                    seen_hashes.add(body_hash)
+                    url_responses.append(json_response)
+                    last_response_time = time.time()
+                    new_response_event.set()
+                    logging.info(f"New iHeartJane (JSON) response captured. Total responses: {len(url_responses)}")
+                    progress_saver.save(json_response, body_hash, api_url)
+
+                    append_to_live_csv(json_response, "output_cleaned", clean_iheartjane_data)
+
+            except JSONDecodeError:
+                logging.warning(f"Failed to parse JSON response for URL: {url}")
+            except Exception as e:
+                logging.error(f"Error processing iHeartJane (JSON) response for URL {url}: {str(e)}")
 
-            logging.info("Scraping completed successfully")
+    page.on("response", handle_response)
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        page.on("request", intercept_graphql)
 
-        except PlaywrightTimeoutError as e:
-            logging.warning(f"Timeout occurred for URL: {url}.")
-            raise e
+    try:
+        logging.info(f"Navigating to URL: {url}")
+        try:
+            await page.goto(url)
         except Exception as e:
-            logging.error(f"Unexpected error while scraping {url}: {str(e)}")
-            raise e
-        finally:
-            if 'context' in locals() and 'page' in locals():
-                logging.info("Closing browser context and page...")
-                page.close()
-                context.close()
-            elif 'browser' in locals():
-                logging.info("Closing browser...")
-                browser.close()
-
-            # Always try to save progress and write final CSVs
-            save_progress(progress_file, url_responses, api_url)
-            timestamp = int(time.time())
-            final_output_file_dutchie = os.path.join(output_folder, f"final_output_dutchie_{sanitized_url}_{timestamp}.csv")
-            final_output_file_generic = os.path.join(output_folder, f"final_output_generic_{sanitized_url}_{timestamp}.csv")
-            final_output_file_unflattened = os.path.join(output_folder, f"final_output_unflattened_{sanitized_url}_{timestamp}.csv")
-            final_output_file_cleaned = os.path.join(output_folder, f"final_output_cleaned_{sanitized_url}_{timestamp}.csv")
-
-            if "dutchie.com" in api_url.lower():
-                process_graphql_responses(url_responses, final_output_file_dutchie, final_output_file_generic, final_output_file_unflattened, api_url)
-            else:
-                process_api_responses(url_responses, final_output_file_cleaned, final_output_file_generic, final_output_file_unflattened, api_url)
-
-            # Delete progress file after successful scraping
-            if os.path.exists(progress_file):
-                os.remove(progress_file)
-                logging.info(f"Deleted progress file: {progress_file}")
-
-            # Delete non-final output files
-            if "dutchie.com" in api_url.lower():
-                for file_pattern in [f"output_dutchie_{sanitized_url}_*.csv",
-                                     f"output_generic_{sanitized_url}_*.csv",
-                                     f"output_unflattened_{sanitized_url}_*.csv"]:
-                    for file_to_delete in glob.glob(os.path.join(output_folder, file_pattern)):
-                        try:
-                            os.remove(file_to_delete)
-                            logging.info(f"Deleted non-final output file: {file_to_delete}")
-                        except Exception as e:
-                            logging.error(f"Error deleting file {file_to_delete}: {str(e)}")
+            if "net::ERR_HTTP2_PROTOCOL_ERROR" in str(e):
+                logging.warning(f"Encountered HTTP/2 protocol error for URL: {url}. Skipping...")
+                return
             else:
-                for file_pattern in [f"output_cleaned_{sanitized_url}_*.csv",
-                                     f"output_generic_{sanitized_url}_*.csv",
-                                     f"output_unflattened_{sanitized_url}_*.csv"]:
-                    for file_to_delete in glob.glob(os.path.join(output_folder, file_pattern)):
-                        try:
-                            os.remove(file_to_delete)
-                            logging.info(f"Deleted non-final output file: {file_to_delete}")
-                        except Exception as e:
-                            logging.error(f"Error deleting file {file_to_delete}: {str(e)}")
-
-    logging.info(f"Scraping process completed for URL: {url}")
-    return url_responses
+                raise
 
+        logging.info("Waiting for page load...")
+        await wait_for_page_or_response(page, new_response_event, REQUEST_TIMEOUT)
+        logging.info(f"Loaded: {url}")
 
-# Update the main function to handle each URL separately
-def main(urls: List[str]):
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-
-    try:
-        for url in urls:
-            try:
-                responses = scrape_url(url)
-                if responses:
-                    logging.info(f"Successfully scraped {url} and saved data to CSV.")
-                else:
-                    logging.warning(f"No data collected for {url}.")
-            except Exception as e:
-                logging.error(f"Failed to scrape {url}: {str(e)}")
-            finally:
-                logging.info(f"Moving to next URL (if any).")
-    except KeyboardInterrupt:
-        logging.info("Keyboard interrupt received. Shutting down gracefully...")
-    except Exception as e:
-        logging.error(f"Unexpected error in main: {str(e)}")
-    finally:
-        logging.info("Scraping process completed for all URLs.")
+        logging.info("Handling age confirmation...")
+        await handle_age_confirmation(page)
 
+        logging.info("Scrolling to bottom of page...")
+        await scroll_to_bottom(page)
 
-# Keep the signal handler as before
-def signal_handler(signum, frame):
-    raise KeyboardInterrupt("Received interrupt signal")
+        # Wake up on every captured response instead of polling, and stop as soon as the idle window has passed
+        while True:
+            remaining = no_new_responses_timeout - (time.time() - last_response_time)
+            if remaining <= 0:
+                logging.info(f"No new responses received in the last {no_new_responses_timeout} seconds. Concluding scrape.")
+                break
 
+            logging.info("Waiting for new responses...")
+            new_response_event.clear()
+            try:
+                await asyncio.wait_for(new_response_event.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
 
-# Modify the main function to handle keyboard interrupts
-def main(urls: List[str]):
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+        logging.info("Scraping completed successfully")
 
-    try:
-        for url in urls:
-            try:
-                scrape_url(url)
-            except Exception as e:
-                logging.error(f"Failed to scrape {url}: {str(e)}")
-                continue
-    except KeyboardInterrupt:
-        logging.info("Keyboard interrupt received. Shutting down gracefully...")
+    except PlaywrightTimeoutError as e:
+        logging.warning(f"Timeout occurred for URL: {url}.")
+        raise e
     except Exception as e:
-        logging.error(f"Unexpected error in main: {str(e)}")
+        logging.error(f"Unexpected error while scraping {url}: {str(e)}")
+        raise e
     finally:
-        logging.info("Scraping process completed.")
-
+        # The browser is shared between URLs, so only this URL's context and page are closed
+        logging.info("Closing browser context and page...")
+        await page.close()
+        await context.close()
+
+        if live_csv_file is not None:
+            live_csv_file.close()
+        progress_saver.close()
+
+        # Progress is already on disk, always try to write final CSVs
+        timestamp = int(time.time())
+        final_output_file_dutchie = output_file("final_output_dutchie", timestamp)
+        final_output_file_generic = output_file("final_output_generic", timestamp)
+        final_output_file_unflattened = output_file("final_output_unflattened", timestamp)
+        final_output_file_cleaned = output_file("final_output_cleaned", timestamp)
+
+        # CSV processing is CPU-bound, run it in the worker pool so the event loop keeps driving the other pages
+        loop = asyncio.get_running_loop()
+        if "dutchie.com" in api_url.lower():
+            await loop.run_in_executor(csv_pool, process_graphql_responses, url_responses, final_output_file_dutchie,
+                                       final_output_file_generic, final_output_file_unflattened, api_url)
+        else:
+            await loop.run_in_executor(csv_pool, process_api_responses, url_responses, final_output_file_cleaned,
+                                       final_output_file_generic, final_output_file_unflattened, api_url)
+
+        # Delete progress files after successful scraping
+        for file_to_delete in [progress_file, progress_meta_filename(progress_file)]:
+            if os.path.exists(file_to_delete):
+                os.remove(file_to_delete)
+                logging.info(f"Deleted progress file: {file_to_delete}")
+
+        # Delete non-final output files in a single directory pass
+        non_final_prefixes = tuple(f"{prefix}_{sanitized_url}_" for prefix in
+                                   ["output_dutchie", "output_cleaned", "output_generic", "output_unflattened"])
+        with os.scandir(output_folder) as entries:
+            for entry in entries:
+                if entry.name.startswith(non_final_prefixes) and entry.name.endswith(CSV_EXTENSION):
+                    try:
+                        os.remove(entry.path)
+                        logging.info(f"Deleted non-final output file: {entry.path}")
+                    except Exception as e:
+                        logging.error(f"Error deleting file {entry.path}: {str(e)}")
 
-# Modify the signal handler to raise a KeyboardInterrupt
-def signal_handler(signum, frame):
-    raise KeyboardInterrupt("Received interrupt signal")
+    logging.info(f"Scraping process completed for URL: {url}")
+    return url_responses
 
 
 def write_results_to_csv(responses, sanitized_url, graphql_url):
+    from json_to_csv import process_api_responses
+
     if responses:
         output_file = f"output_{sanitized_url}_{int(time.time())}.csv"
         try:
@@ -475,17 +768,56 @@ def write_results_to_csv(responses, sanitized_url, graphql_url):
         logging.warning(f"No GraphQL responses to write to CSV.")
 
 
-def scrape_urls_parallel(urls: List[str]):
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_url = {executor.submit(scrape_url, url): url for url in urls}
-        for future in as_completed(future_to_url):
-            url = future_to_url[future]
-            try:
-                future.result()
-            except Exception as exc:
-                logging.error(f'{url} generated an exception: {exc}')
-            finally:
-                rate_limit()
+async def scrape_urls_parallel(urls: List[str]):
+    from playwright.async_api import async_playwright
+
+    # All URLs share one browser on a single event loop, each one gets its own context
+    semaphore = AdaptiveSemaphore(MAX_WORKERS)
+    start_bucket = TokenBucket(RATE_LIMIT_DELAY, MAX_WORKERS)
+    browser_lock = asyncio.Lock()
+    # Spawned rather than forked, forking a process that is running Playwright's threads is not safe
+    mp_context = multiprocessing.get_context('spawn')
+    log_queue = mp_context.Queue()
+    log_listener = QueueListener(log_queue, *logging.getLogger().handlers, respect_handler_level=True)
+    log_listener.start()
+    csv_pool = ProcessPoolExecutor(max_workers=min(MAX_WORKERS, os.cpu_count() or 1), mp_context=mp_context,
+                                   initializer=setup_worker_logging, initargs=(log_queue,))
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=HEADLESS_MODE, args=list(CHROMIUM_ARGS))
+
+        async def get_browser():
+            # Relaunch the shared browser if it crashed, so one crash doesn't fail every remaining URL
+            nonlocal browser
+            async with browser_lock:
+                if not browser.is_connected():
+                    logging.warning("Shared browser disconnected. Relaunching...")
+                    browser = await p.chromium.launch(headless=HEADLESS_MODE, args=list(CHROMIUM_ARGS))
+            return browser
+
+        async def scrape_with_limits(url):
+            async with semaphore:
+                await start_bucket.acquire()
+                try:
+                    result = await scrape_url(url, await get_browser(), csv_pool)
+                except Exception as e:
+                    # Retries are already exhausted, repeated timeouts mean the site is struggling, so back off
+                    if is_timeout_exception(e):
+                        await semaphore.record_timeout()
+                    raise
+                await semaphore.increase()
+                return result
+
+        try:
+            results = await asyncio.gather(*(scrape_with_limits(url) for url in urls), return_exceptions=True)
+        finally:
+            await browser.close()
+            csv_pool.shutdown()
+            log_listener.stop()
+
+    for url, result in zip(urls, results):
+        if isinstance(result, Exception):
+            logging.error(f'{url} generated an exception: {result}')
 
 
 def signal_handler(signum, frame):
@@ -507,7 +839,7 @@ def main(urls: List[str]):
     signal.signal(signal.SIGTERM, signal_handler)
 
     try:
-        scrape_urls_parallel(urls)
+        asyncio.run(scrape_urls_parallel(urls))
     except Exception as e:
         logging.error(f"Unexpected error: {str(e)}")
 
@@ -1,23 +1,52 @@
 import csv
+import gzip
 import json
 import logging
-from urllib.parse import urlparse
 import os
-from typing import Union, List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, List, Dict, Any, Callable, Iterable, Iterator, TextIO, Tuple
+
+# Nested values in the generic cleaned CSV are serialized with orjson when it is installed, the standard library
+# fallback is configured for the same compact UTF-8 output
+try:
+    import orjson
+
+    def json_dumps(value: Any) -> str:
+        try:
+            return orjson.dumps(value).decode()
+        except orjson.JSONEncodeError:
+            # orjson rejects integers wider than 64 bits and non-string keys
+            return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+except ImportError:
+    def json_dumps(value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+# Output CSVs can be many MB, a 1 MiB buffer turns the default 8 KiB writes into far fewer syscalls
+CSV_BUFFER_SIZE = 1024 * 1024
+
+# Shared read-only default for nested .get() lookups, so a missing key doesn't allocate a new dict every time
+EMPTY = {}
+
+CLEANED_FIELDNAMES = ['Name', 'Category', 'SubCategory', 'THC', 'CBD', 'Price', 'Strain', 'Brand', 'Weight', 'Type',
+                      'Description']
+
+
+def is_dutchie_url(url: str) -> bool:
+    # Plain substring check, the Dutchie API is only ever served from dutchie.com hosts so the URL isn't parsed
+    return 'dutchie.com' in url.lower()
 
 
 def is_dutchie_menu(responses: List[Dict[str, Any]], graphql_url: str) -> bool:
     try:
-        logging.debug(f"Checking if {graphql_url} is a Dutchie menu")
-        parsed_url = urlparse(graphql_url)
-        if 'dutchie' in parsed_url.netloc:
-            logging.info(f"{graphql_url} is a Dutchie menu")
+        logging.debug("Checking if %s is a Dutchie menu", graphql_url)
+        if is_dutchie_url(graphql_url):
+            logging.info("%s is a Dutchie menu", graphql_url)
             return True
         else:
-            logging.info(f"{graphql_url} is not a Dutchie menu")
+            logging.info("%s is not a Dutchie menu", graphql_url)
             return False
     except Exception as e:
-        logging.error(f"Error in is_dutchie_menu: {str(e)}")
+        logging.error("Error in is_dutchie_menu: %s", e)
         return False
 
 
@@ -27,48 +56,143 @@ def clean_dutchie_data(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         if 'data' in item and 'menu' in item['data']:
             for product in item['data']['menu']:
                 try:
-                    variants = product.get('variants', [])
-                    prices = [variant.get('option', {}).get('price') for variant in variants if variant.get('option')]
-                    price_range = f"${min(prices)}-${max(prices)}" if prices else "N/A"
-                    if prices and min(prices) == max(prices):
-                        price_range = f"${min(prices)}"
-
+                    # One pass over the variants collects the price bounds and the Weight labels together
+                    low = high = None
+                    weights = []
+                    for variant in product.get('variants', []):
+                        option = variant.get('option')
+                        if not option:
+                            continue
+                        price = option.get('price')
+                        if not weights:
+                            low = high = price
+                        else:
+                            if price < low:
+                                low = price
+                            if price > high:
+                                high = price
+                        weights.append(f"{option.get('label')}: ${price}")
+                    if not weights:
+                        price_range = "N/A"
+                    elif low == high:
+                        price_range = f"${low}"
+                    else:
+                        price_range = f"${low}-${high}"
+
+                    get = product.get
+                    potency = get('potency', EMPTY)
                     cleaned_product = {
-                        'Name': product.get('name', ''),
-                        'Category': product.get('category', {}).get('name', ''),
-                        'SubCategory': product.get('subcategory', {}).get('name', ''),
-                        'THC': product.get('potency', {}).get('thc', ''),
-                        'CBD': product.get('potency', {}).get('cbd', ''),
+                        'Name': get('name', ''),
+                        'Category': get('category', EMPTY).get('name', ''),
+                        'SubCategory': get('subcategory', EMPTY).get('name', ''),
+                        'THC': potency.get('thc', ''),
+                        'CBD': potency.get('cbd', ''),
                         'Price': price_range,
-                        'Strain': product.get('strain', {}).get('name', ''),
-                        'Brand': product.get('brand', {}).get('name', ''),
-                        'Weight': ', '.join(
-                            [f"{v.get('option', {}).get('label')}: ${v.get('option', {}).get('price')}" for v in
-                             variants if v.get('option')]),
-                        'Type': product.get('type', ''),
-                        'Description': product.get('description', '').replace('\n', ' ').replace('\r', '')
+                        'Strain': get('strain', EMPTY).get('name', ''),
+                        'Brand': get('brand', EMPTY).get('name', ''),
+                        'Weight': ', '.join(weights),
+                        'Type': get('type', ''),
+                        'Description': get('description', '').replace('\n', ' ').replace('\r', '')
                     }
                     cleaned_data.append(cleaned_product)
                 except Exception as e:
-                    logging.error(f"Error cleaning product data: {str(e)}")
-                    logging.error(f"Product data: {product}")
+                    logging.error("Error cleaning product data: %s", e)
+                    logging.error("Product data: %s", product)
     return cleaned_data
 
 
+def iter_leaves(data: Any, prefix: str = '') -> Iterator[Tuple[str, Any]]:
+    # Iterative depth-first walk yielding (key, value) for every leaf. Children are pushed in reverse
+    # so they are popped, and their keys yielded, in document order.
+    stack = [(prefix, data)]
+    while stack:
+        key, value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(reversed([(f"{key}.{k}" if key else k, v) for k, v in value.items()]))
+        elif isinstance(value, list):
+            stack.extend(reversed([(f"{key}[{i}]", v) for i, v in enumerate(value)]))
+        else:
+            yield key, value
+
+
 def flatten_json(data: Any, prefix: str = '') -> Dict[str, Any]:
+    # A later duplicate key overrides an earlier one
+    return dict(iter_leaves(data, prefix))
+
+
+def sorted_fieldnames(rows: Iterable[Dict[str, Any]]) -> List[str]:
+    # One growing set instead of unpacking every dict's keys into set().union(*...)
+    fieldnames = set()
+    for row in rows:
+        fieldnames.update(row)
+    return sorted(fieldnames)
+
+
+def flatten_non_blank_row(response: Any) -> Dict[str, str]:
+    # Leaves are stored as the cleaned cell strings and blank or whitespace-only values are skipped as they are
+    # found, so no unfiltered dict is built and each value is stringified once
     result = {}
-    if isinstance(data, dict):
-        for key, value in data.items():
-            new_key = f"{prefix}.{key}" if prefix else key
-            result.update(flatten_json(value, new_key))
-    elif isinstance(data, list):
-        for i, item in enumerate(data):
-            result.update(flatten_json(item, f"{prefix}[{i}]"))
-    else:
-        result[prefix] = data
+    for key, value in iter_leaves(response):
+        cell = str(value)
+        if cell.strip():
+            result[key] = cell.replace('\n', ' ').replace('\r', '')
+        else:
+            # A later duplicate key overrides an earlier one, as in flatten_json
+            result.pop(key, None)
     return result
 
 
+def flatten_non_blank(responses: List[Any]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    # Flattens each response, collecting the remaining keys in the same pass
+    rows = []
+    fieldnames = set()
+    for response in responses:
+        row = flatten_non_blank_row(response)
+        fieldnames.update(row)
+        rows.append(row)
+    return rows, sorted(fieldnames)
+
+
+def csv_row(item: Dict[str, Any], fieldnames: List[str]) -> List[str]:
+    # Plain csv.writer rows in fieldname order, missing keys are written as empty cells like DictWriter's restval
+    return [str(item.get(key, '')).replace('\n', ' ').replace('\r', '') for key in fieldnames]
+
+
+def log_file_size(output_file: str) -> None:
+    # Only stat the file at DEBUG level, a successful write already implies it exists
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("File size: %d bytes", os.path.getsize(output_file))
+
+
+def open_csv(output_file: str) -> TextIO:
+    # A .gz path is written through gzip at level 1, which roughly halves the bytes written for little CPU
+    if output_file.endswith('.gz'):
+        return gzip.open(output_file, 'wt', compresslevel=1, encoding='utf-8', newline='')
+    return open(output_file, 'w', newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE)
+
+
+def write_csv(output_file: str, fieldnames: List[str], rows: Iterable[Dict[str, Any]]) -> None:
+    with open_csv(output_file) as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+        writer.writerows(csv_row(item, fieldnames) for item in rows)
+
+
+def open_csv_writer(output_file: str, fieldnames: List[str]) -> Tuple[TextIO, Any]:
+    csvfile = open_csv(output_file)
+    writer = csv.writer(csvfile)
+    writer.writerow(fieldnames)
+    return csvfile, writer
+
+
+def append_response(writer: Any, response: Union[Dict[str, Any], List[Any]],
+                    cleaner: Callable[[List[Any]], List[Dict[str, Any]]],
+                    fieldnames: List[str] = CLEANED_FIELDNAMES) -> int:
+    cleaned_data = cleaner([response])
+    writer.writerows(csv_row(item, fieldnames) for item in cleaned_data)
+    return len(cleaned_data)
+
+
 def process_api_responses(responses: List[Union[Dict[str, Any], List[Any]]], output_file_cleaned: str,
                           output_file_generic: str, output_file_unflattened: str, api_url: str) -> None:
     if not responses:
@@ -78,83 +202,74 @@ def process_api_responses(responses: List[Union[Dict[str, Any], List[Any]]], out
     try:
         is_iheartjane = "iheartjane.com" in api_url.lower() or "x-algolia-agent" in api_url.lower()
 
-        logging.info(f"API type detected: {'iHeartJane' if is_iheartjane else 'Unknown'}")
-        logging.info(f"API URL: {api_url}")
-        logging.info(f"Number of responses: {len(responses)}")
-        logging.info(f"First response type: {type(responses[0])}")
-        logging.debug(
-            f"First response preview: {json.dumps(responses[0])[:500]}...")  # Log the first 500 characters of the first response
+        logging.info("API type detected: %s", 'iHeartJane' if is_iheartjane else 'Unknown')
+        logging.info("API URL: %s", api_url)
+        logging.info("Number of responses: %d", len(responses))
+        logging.info("First response type: %s", type(responses[0]))
+        # Only serialized when DEBUG is enabled, the first response can be megabytes
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("First response preview: %s...",
+                          json_dumps(responses[0])[:500])  # Log the first 500 characters of the first response
 
         if is_iheartjane:
             logging.info("Using iHeartJane data cleaning.")
-            cleaned_data = clean_iheartjane_data(responses)
+            cleaner = clean_iheartjane_data
         else:
             logging.info("Using generic data cleaning.")
-            cleaned_data = clean_generic_data(responses)
+            cleaner = clean_generic_data
+
+        # One walk over the responses builds the rows and fieldnames for all three CSVs
+        logging.info("Cleaning and flattening data...")
+        cleaned_data = []
+        cleaned_flattened_data = []
+        fieldnames_generic = set()
+        unflattened_data = []
+        fieldnames_unflattened = set()
+        for response in responses:
+            cleaned_data.extend(cleaner([response]))
+
+            row = flatten_non_blank_row(response)
+            fieldnames_generic.update(row)
+            cleaned_flattened_data.append(row)
+
+            if isinstance(response, dict):
+                fieldnames_unflattened.update(response)
+                unflattened_data.append(response)
+            else:
+                logging.warning("Skipping non-dict response: %s", type(response))
 
         if cleaned_data:
-            fieldnames_cleaned = list(cleaned_data[0].keys())
-            logging.info(f"Number of cleaned items: {len(cleaned_data)}")
-            logging.info(f"Cleaned fieldnames: {fieldnames_cleaned}")
+            # Generic items don't all share the first item's keys, so take the union in first-seen order
+            fieldnames_cleaned = list(dict.fromkeys(key for item in cleaned_data for key in item))
+            logging.info("Number of cleaned items: %d", len(cleaned_data))
+            logging.info("Cleaned fieldnames: %s", fieldnames_cleaned)
         else:
             logging.warning("No cleaned data to process.")
             return
 
-        logging.info(f"Writing cleaned CSV to: {output_file_cleaned}")
-        with open(output_file_cleaned, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames_cleaned)
-            writer.writeheader()
-            for item in cleaned_data:
-                writer.writerow({k: str(v).replace('\n', ' ').replace('\r', '') for k, v in item.items()})
-
-        logging.info(f"Successfully wrote cleaned data to {output_file_cleaned}")
-        logging.info(f"File size: {os.path.getsize(output_file_cleaned)} bytes")
-        logging.info(f"File exists: {os.path.exists(output_file_cleaned)}")
-
-        # Generic data flattening
-        logging.info("Flattening generic data...")
-        flattened_data = [flatten_json(response) for response in responses]
-        fieldnames_generic = sorted(set().union(*(d.keys() for d in flattened_data if isinstance(d, dict))))
-
-        # Remove blank or whitespace-only columns from generic data
-        cleaned_flattened_data = [{k: v for k, v in item.items() if str(v).strip()} for item in flattened_data if
-                                  isinstance(item, dict)]
-        cleaned_fieldnames_generic = sorted(set().union(*(d.keys() for d in cleaned_flattened_data)))
-
-        logging.info(f"Writing generic CSV to: {output_file_generic}")
-        with open(output_file_generic, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=cleaned_fieldnames_generic)
-            writer.writeheader()
-            for item in cleaned_flattened_data:
-                writer.writerow({k: str(v).replace('\n', ' ').replace('\r', '') for k, v in item.items()})
-
-        logging.info(f"Successfully wrote generic data to {output_file_generic}")
-        logging.info(f"File size: {os.path.getsize(output_file_generic)} bytes")
-        logging.info(f"File exists: {os.path.exists(output_file_generic)}")
-
-        # Unflattened data
-        logging.info("Writing unflattened data...")
-        fieldnames_unflattened = sorted(set().union(*(d.keys() for d in responses if isinstance(d, dict))))
-
-        logging.info(f"Writing unflattened CSV to: {output_file_unflattened}")
-        with open(output_file_unflattened, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames_unflattened)
-            writer.writeheader()
-            for response in responses:
-                if isinstance(response, dict):
-                    writer.writerow({k: str(v).replace('\n', ' ').replace('\r', '') for k, v in response.items()})
-                else:
-                    logging.warning(f"Skipping non-dict response: {type(response)}")
-
-        logging.info(f"Successfully wrote unflattened data to {output_file_unflattened}")
-        logging.info(f"File size: {os.path.getsize(output_file_unflattened)} bytes")
-        logging.info(f"File exists: {os.path.exists(output_file_unflattened)}")
+        # The three files are independent, so they are written concurrently. File writes and gzip compression
+        # release the GIL, so one file's I/O overlaps with building the next file's rows.
+        jobs = [
+            ("cleaned", output_file_cleaned, fieldnames_cleaned, cleaned_data),
+            ("generic", output_file_generic, sorted(fieldnames_generic), cleaned_flattened_data),
+            ("unflattened", output_file_unflattened, sorted(fieldnames_unflattened), unflattened_data),
+        ]
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            futures = []
+            for label, output_file, fieldnames, rows in jobs:
+                logging.info("Writing %s CSV to: %s", label, output_file)
+                futures.append(executor.submit(write_csv, output_file, fieldnames, rows))
+
+        for (label, output_file, _, _), future in zip(jobs, futures):
+            future.result()
+            logging.info("Successfully wrote %s data to %s", label, output_file)
+            log_file_size(output_file)
     except Exception as e:
-        logging.error(f"Error in process_api_responses: {str(e)}")
-        logging.error(f"API URL: {api_url}")
-        logging.error(f"Responses type: {type(responses)}")
-        logging.error(
-            f"Responses preview: {json.dumps(responses[:2])[:1000]}...")  # Log the first two responses, up to 1000 characters
+        logging.error("Error in process_api_responses: %s", e)
+        logging.error("API URL: %s", api_url)
+        logging.error("Responses type: %s", type(responses))
+        logging.error("Responses preview: %s...",
+                      json_dumps(responses[:2])[:1000])  # Log the first two responses, up to 1000 characters
         raise
 
 
@@ -165,66 +280,46 @@ def process_graphql_responses(responses: List[Dict[str, Any]], output_file_dutch
         return
 
     try:
-        is_dutchie = "dutchie.com" in graphql_url.lower()
-        logging.info(f"Dutchie menu detected: {is_dutchie}")
+        is_dutchie = is_dutchie_url(graphql_url)
+        logging.info("Dutchie menu detected: %s", is_dutchie)
 
         if is_dutchie:
             logging.info("Using Dutchie data cleaning.")
-            cleaned_data = clean_dutchie_data(responses)
-            fieldnames_dutchie = ['Name', 'Category', 'SubCategory', 'THC', 'CBD', 'Price', 'Strain', 'Brand', 'Weight',
-                                  'Type', 'Description']
+            # The columns are fixed, so products are cleaned one response at a time as the CSV is written
+            cleaned_data = (product for response in responses for product in clean_dutchie_data([response]))
+            fieldnames_dutchie = CLEANED_FIELDNAMES
         else:
             logging.warning("Unexpected GraphQL response structure. Falling back to generic data flattening.")
             cleaned_data = [flatten_json(response) for response in responses]
-            fieldnames_dutchie = sorted(set().union(*(d.keys() for d in cleaned_data)))
+            fieldnames_dutchie = sorted_fieldnames(cleaned_data)
 
-        logging.info(f"Writing Dutchie/cleaned CSV to: {output_file_dutchie}")
-        with open(output_file_dutchie, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames_dutchie)
-            writer.writeheader()
-            for item in cleaned_data:
-                writer.writerow({k: str(v).replace('\n', ' ').replace('\r', '') for k, v in item.items()})
+        logging.info("Writing Dutchie/cleaned CSV to: %s", output_file_dutchie)
+        write_csv(output_file_dutchie, fieldnames_dutchie, cleaned_data)
 
-        logging.info(f"Successfully wrote Dutchie/cleaned data to {output_file_dutchie}")
-        logging.info(f"File size: {os.path.getsize(output_file_dutchie)} bytes")
-        logging.info(f"File exists: {os.path.exists(output_file_dutchie)}")
+        logging.info("Successfully wrote Dutchie/cleaned data to %s", output_file_dutchie)
+        log_file_size(output_file_dutchie)
 
         # Generic data flattening
         logging.info("Flattening generic data...")
-        flattened_data = [flatten_json(response) for response in responses]
-        fieldnames_generic = sorted(set().union(*(d.keys() for d in flattened_data)))
-
-        # Remove blank or whitespace-only columns from generic data
-        cleaned_flattened_data = [{k: v for k, v in item.items() if str(v).strip()} for item in flattened_data]
-        cleaned_fieldnames_generic = sorted(set().union(*(d.keys() for d in cleaned_flattened_data)))
+        cleaned_flattened_data, cleaned_fieldnames_generic = flatten_non_blank(responses)
 
-        logging.info(f"Writing generic CSV to: {output_file_generic}")
-        with open(output_file_generic, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=cleaned_fieldnames_generic)
-            writer.writeheader()
-            for item in cleaned_flattened_data:
-                writer.writerow({k: str(v).replace('\n', ' ').replace('\r', '') for k, v in item.items()})
+        logging.info("Writing generic CSV to: %s", output_file_generic)
+        write_csv(output_file_generic, cleaned_fieldnames_generic, cleaned_flattened_data)
 
-        logging.info(f"Successfully wrote generic data to {output_file_generic}")
-        logging.info(f"File size: {os.path.getsize(output_file_generic)} bytes")
-        logging.info(f"File exists: {os.path.exists(output_file_generic)}")
+        logging.info("Successfully wrote generic data to %s", output_file_generic)
+        log_file_size(output_file_generic)
 
         # Unflattened data
         logging.info("Writing unflattened data...")
-        fieldnames_unflattened = sorted(set().union(*(d.keys() for d in responses)))
-
-        logging.info(f"Writing unflattened CSV to: {output_file_unflattened}")
-        with open(output_file_unflattened, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames_unflattened)
-            writer.writeheader()
-            for response in responses:
-                writer.writerow({k: str(v).replace('\n', ' ').replace('\r', '') for k, v in response.items()})
-
-        logging.info(f"Successfully wrote unflattened data to {output_file_unflattened}")
-        logging.info(f"File size: {os.path.getsize(output_file_unflattened)} bytes")
-        logging.info(f"File exists: {os.path.exists(output_file_unflattened)}")
+        fieldnames_unflattened = sorted_fieldnames(responses)
+
+        logging.info("Writing unflattened CSV to: %s", output_file_unflattened)
+        write_csv(output_file_unflattened, fieldnames_unflattened, responses)
+
+        logging.info("Successfully wrote unflattened data to %s", output_file_unflattened)
+        log_file_size(output_file_unflattened)
     except Exception as e:
-        logging.error(f"Error in process_graphql_responses: {str(e)}")
+        logging.error("Error in process_graphql_responses: %s", e)
         raise
 
 
@@ -236,53 +331,62 @@ def clean_iheartjane_data(responses: List[Union[Dict[str, Any], List[Any]]]) ->
         elif isinstance(response, list):
             hits = response
         else:
-            logging.warning(f"Unexpected response structure: {type(response)}")
+            logging.warning("Unexpected response structure: %s", type(response))
             continue
 
         for hit in hits:
             if isinstance(hit, dict):
+                # Each nested value is looked up once and only used when it is a dict
+                get = hit.get
+                thc, cbd, price, brand, weight = get('thc'), get('cbd'), get('price'), get('brand'), get('weight')
+                hit_type = get('type', '')
                 cleaned_item = {
-                    'Name': hit.get('name', ''),
-                    'Category': hit.get('type', ''),
-                    'SubCategory': hit.get('subcategory', ''),
-                    'THC': hit.get('thc', {}).get('range', '') if isinstance(hit.get('thc'), dict) else '',
-                    'CBD': hit.get('cbd', {}).get('range', '') if isinstance(hit.get('cbd'), dict) else '',
-                    'Price': f"${hit.get('price', {}).get('price', '')}" if isinstance(hit.get('price'), dict) else '',
-                    'Strain': hit.get('strainType', ''),
-                    'Brand': hit.get('brand', {}).get('name', '') if isinstance(hit.get('brand'), dict) else '',
-                    'Weight': hit.get('weight', {}).get('label', '') if isinstance(hit.get('weight'), dict) else '',
-                    'Type': hit.get('type', ''),
-                    'Description': str(hit.get('description', '')).replace('\n', ' ').replace('\r', '')
+                    'Name': get('name', ''),
+                    'Category': hit_type,
+                    'SubCategory': get('subcategory', ''),
+                    'THC': thc.get('range', '') if isinstance(thc, dict) else '',
+                    'CBD': cbd.get('range', '') if isinstance(cbd, dict) else '',
+                    'Price': f"${price.get('price', '')}" if isinstance(price, dict) else '',
+                    'Strain': get('strainType', ''),
+                    'Brand': brand.get('name', '') if isinstance(brand, dict) else '',
+                    'Weight': weight.get('label', '') if isinstance(weight, dict) else '',
+                    'Type': hit_type,
+                    'Description': str(get('description', '')).replace('\n', ' ').replace('\r', '')
                 }
                 cleaned_data.append(cleaned_item)
             else:
-                logging.warning(f"Unexpected hit type: {type(hit)}")
+                logging.warning("Unexpected hit type: %s", type(hit))
     return cleaned_data
 
 
+# Decoded JSON only contains these exact types, so a set lookup on type() replaces the isinstance() tuple checks
+SCALAR_TYPES = frozenset((str, int, float, bool))
+CONTAINER_TYPES = frozenset((list, dict))
+
+
+def clean_generic_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    # Scalars are kept as-is, nested lists and dicts become JSON strings, anything else (e.g. None) is dropped
+    cleaned_item = {}
+    for key, value in item.items():
+        value_type = type(value)
+        if value_type in SCALAR_TYPES:
+            cleaned_item[key] = value
+        elif value_type in CONTAINER_TYPES:
+            cleaned_item[key] = json_dumps(value)
+    return cleaned_item
+
+
 def clean_generic_data(responses: List[Union[Dict[str, Any], List[Any]]]) -> List[Dict[str, Any]]:
     cleaned_data = []
     for response in responses:
         if isinstance(response, dict):
-            cleaned_item = {}
-            for key, value in response.items():
-                if isinstance(value, (str, int, float, bool)):
-                    cleaned_item[key] = value
-                elif isinstance(value, (list, dict)):
-                    cleaned_item[key] = json.dumps(value)
-            cleaned_data.append(cleaned_item)
+            cleaned_data.append(clean_generic_item(response))
         elif isinstance(response, list):
             for item in response:
                 if isinstance(item, dict):
-                    cleaned_item = {}
-                    for key, value in item.items():
-                        if isinstance(value, (str, int, float, bool)):
-                            cleaned_item[key] = value
-                        elif isinstance(value, (list, dict)):
-                            cleaned_item[key] = json.dumps(value)
-                    cleaned_data.append(cleaned_item)
+                    cleaned_data.append(clean_generic_item(item))
                 else:
-                    logging.warning(f"Unexpected item type in list: {type(item)}")
+                    logging.warning("Unexpected item type in list: %s", type(item))
         else:
-            logging.warning(f"Unexpected response type: {type(response)}")
+            logging.warning("Unexpected response type: %s", type(response))
     return cleaned_data